@@ -1,19 +1,42 @@
 import os
 import sys
 import json
+import codecs
+import gzip
+import heapq
 import time
+import queue
+import socket
 import shutil
+import hashlib
 import threading
+import operator
+import subprocess
 import webbrowser
 import pyperclip
+from array import array
+from bisect import bisect_right
 from pathlib import Path
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import pytz
 import requests
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if os.name == 'nt':
+    import msvcrt
+    fcntl = None
+else:
+    import fcntl
+
 # Скрываем консоль при запуске через ярлык
 if sys.executable.endswith("pythonw.exe"):
     sys.stdout = open(os.devnull, 'w')
@@ -31,13 +54,1319 @@ os.makedirs(CONFIG_DIR, exist_ok=True)
 # Пути к файлам
 CONFIG_FILE = str(CONFIG_DIR / "config.json")
 HISTORY_FILE = str(CONFIG_DIR / "inventory_history.json")
+PRICES_FILE = str(CONFIG_DIR / "price_history.json")
+ARCHIVE_DIR = CONFIG_DIR / "archive"
 OLD_HISTORY_FILE = "inventory_history.json"  # Для миграции старых данных
 
 # API endpoints
 INVENTORY_API = "https://egg-surprise.shop/api/inventory/get"
 ITEMS_API = "https://egg-surprise.shop/api/get-all-items"
+CATALOG_PRICE_FIELD = "Price"  # Поле цены в ответе ITEMS_API
 CHECK_INTERVAL = 600  # 10 минут
+RETENTION_INTERVAL = 6 * 60 * 60  # Как часто запускать сжатие и архивацию истории, сек
+ARCHIVE_CACHE_SEGMENTS = 2  # Сколько распакованных сегментов архива держать в памяти
+VIEWER_POLL_INTERVAL = 5  # Как часто режим просмотра проверяет новую версию истории, сек
 TIMEZONE = pytz.timezone('Europe/Moscow')
+DATE_KEY_FORMAT = "%Y-%m-%d"
+IMPORT_CHUNK_SIZE = 64 * 1024  # Размер блока при потоковом чтении истории
+
+def iter_history_file(file_path, chunk_size=IMPORT_CHUNK_SIZE):
+    """Потоково разбирает файл истории и возвращает (дата, день, прочитано байт)"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ""
+    pos = 0
+    eof = False
+    bytes_read = 0
+
+    with open(file_path, 'rb') as f:
+        def read_more(size):
+            nonlocal buffer, pos, eof, bytes_read
+            raw = f.read(size)
+            if raw:
+                bytes_read += len(raw)
+                buffer = buffer[pos:] + text_decoder.decode(raw)
+            else:
+                eof = True
+                buffer = buffer[pos:] + text_decoder.decode(b"", final=True)
+            pos = 0
+
+        def next_char():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    return ""
+                read_more(chunk_size)
+
+        def decode_value():
+            nonlocal pos
+            size = chunk_size
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # Значение в самом конце буфера может быть обрезано
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more(size)
+                size *= 2  # Крупные дни дочитываем всё большими блоками
+
+        if next_char() != '{':
+            raise ValueError("Неверный формат файла истории")
+        pos += 1
+
+        allow_close = True  # Пустой объект допустим, висячая запятая — нет
+        while True:
+            ch = next_char()
+            if ch == '}' and allow_close:
+                break
+            if ch != '"':
+                raise ValueError(f"Неверный формат файла истории (позиция {bytes_read})")
+            date_key = decode_value()
+            if next_char() != ':':
+                raise ValueError(f"Ожидалось ':' после ключа {date_key!r}")
+            pos += 1
+            next_char()
+            day = decode_value()
+            yield date_key, day, bytes_read
+
+            ch = next_char()
+            if ch == ',':
+                pos += 1
+                allow_close = False
+            elif ch == '}':
+                break
+            else:
+                raise ValueError(f"Неверный формат файла истории после {date_key!r}")
+
+        pos += 1
+        if next_char():
+            raise ValueError("Лишние данные после конца файла истории")
+
+def _validate_counts(counts, where):
+    if not isinstance(counts, dict):
+        raise ValueError(f"{where}: ожидался объект")
+    result = {}
+    for item_id, count in counts.items():
+        if isinstance(count, bool) or not isinstance(count, int):
+            raise ValueError(f"{where}: количество предмета {item_id} не целое число")
+        result[str(item_id)] = count
+    return result
+
+def validate_history_day(date_key, day):
+    """Проверяет структуру дня истории и возвращает нормализованную копию"""
+    try:
+        datetime.strptime(date_key, DATE_KEY_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError(f"Неверная дата: {date_key!r}")
+
+    if not isinstance(day, dict):
+        raise ValueError(f"{date_key}: день должен быть объектом")
+
+    initial = _validate_counts(day.get("initial"), f"{date_key}.initial")
+    last_state = _validate_counts(day.get("last_state", initial), f"{date_key}.last_state")
+
+    records = day.get("changes", [])
+    if not isinstance(records, list):
+        raise ValueError(f"{date_key}.changes: ожидался список")
+
+    changes = []
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError(f"{date_key}.changes: запись должна быть объектом")
+        timestamp = record.get("timestamp")
+        try:
+            datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            raise ValueError(f"{date_key}.changes: неверная метка времени {timestamp!r}")
+        changes.append({
+            "timestamp": timestamp,
+            "changes": _validate_counts(record.get("changes"), f"{date_key}.changes[{timestamp}]")
+        })
+
+    result = {"initial": initial, "changes": changes, "last_state": last_state}
+    # Сжатые дни помнят, до какого момента записи уже свёрнуты
+    through = day.get("compacted_through")
+    if through is not None:
+        try:
+            datetime.fromisoformat(through)
+        except (TypeError, ValueError):
+            raise ValueError(f"{date_key}: неверная метка compacted_through {through!r}")
+        result["compacted_through"] = through
+    # Недельные сводки политики хранения сохраняют список вошедших дней
+    if day.get("period") == "week" and isinstance(day.get("days"), list):
+        result["period"] = "week"
+        result["days"] = [str(d) for d in day["days"]]
+    return result
+
+def change_record_key(record):
+    """Ключ для дедупликации записей изменений"""
+    return record["timestamp"], tuple(sorted(record["changes"].items()))
+
+def merge_history_day(history, date_key, day):
+    """Объединяет проверенный день с историей, возвращает число новых записей"""
+    existing = history.get(date_key)
+    if existing is None:
+        history[date_key] = day
+        return len(day["changes"])
+
+    existing_last = max((r["timestamp"] for r in existing["changes"]), default="")
+    imported_last = max((r["timestamp"] for r in day["changes"]), default="")
+    existing_through = compacted_through(existing)
+    imported_through = compacted_through(day)
+
+    if imported_through > existing_last:
+        # Импортированная сводка покрывает больше наших записей — заменяем их ею
+        existing["changes"] = [r for r in existing["changes"] if r["timestamp"] > imported_through]
+        existing["compacted_through"] = imported_through
+        covered = ""
+    else:
+        # Записи, уже свёрнутые в сводку, повторно не добавляем
+        covered = max(existing_through, imported_through)
+
+    seen = {change_record_key(r) for r in existing["changes"]}
+    added = 0
+    for record in day["changes"]:
+        key = change_record_key(record)
+        if key in seen or record["timestamp"] <= covered:
+            continue
+        seen.add(key)
+        existing["changes"].append(record)
+        added += 1
+
+    if added:
+        existing["changes"].sort(key=lambda r: r["timestamp"])
+
+    # Начальное состояние дополняем, последнее берём из более свежих данных
+    for item_id, count in day["initial"].items():
+        existing["initial"].setdefault(item_id, count)
+    if imported_last > existing_last:
+        existing["last_state"] = day["last_state"].copy()
+    if day.get("period") == "week" or existing.get("period") == "week":
+        existing["period"] = "week"
+        existing["days"] = sorted(set(existing.get("days", [date_key])).union(day.get("days", [date_key])))
+
+    return added
+
+def summarize_day(day):
+    """Краткая сводка дня для списка дней API и индекса архива"""
+    deltas = [count - day["initial"].get(item_id, 0)
+              for item_id, count in day["last_state"].items()]
+    return {
+        "records": len(day["changes"]),
+        "items": len(day["last_state"]),
+        "changed_items": sum(1 for delta in deltas if delta),
+        "gained": sum(delta for delta in deltas if delta > 0),
+        "lost": -sum(delta for delta in deltas if delta < 0)
+    }
+
+def compacted_through(day):
+    """Метка времени, до которой записи дня свёрнуты в сводку ("" — не сжат)"""
+    return day.get("compacted_through") or ""
+
+def compact_day(day):
+    """Сворачивает записи изменений дня в одну запись с чистыми дельтами"""
+    if len(day["changes"]) <= 1:
+        return False
+    net = defaultdict(int)
+    for record in day["changes"]:
+        for item_id, delta in record["changes"].items():
+            net[item_id] += delta
+    last = max(record["timestamp"] for record in day["changes"])
+    day["changes"] = [{
+        "timestamp": last,
+        "changes": {item_id: delta for item_id, delta in net.items() if delta}
+    }]
+    day["compacted_through"] = max(compacted_through(day), last)
+    return True
+
+def rollup_week(days):
+    """Объединяет отсортированные дни [(дата, день)] одной недели в недельную сводку"""
+    covered = set()
+    covered_through = ""
+    for date_key, day in days:
+        if day.get("period") == "week":
+            covered.update(day["days"])
+            covered_through = max(covered_through, compacted_through(day))
+
+    kept = []
+    merged_days = set()
+    records = []
+    through = ""
+    for date_key, day in days:
+        day_records = day["changes"]
+        if day.get("period") == "week":
+            merged_days.update(day["days"])
+        elif date_key in covered:
+            # День уже учтён в сводке, берём только записи новее неё
+            day_records = [r for r in day_records if r["timestamp"] > covered_through]
+            if not day_records:
+                continue
+        else:
+            merged_days.add(date_key)
+        kept.append(day)
+        records.extend(day_records)
+        through = max([through, compacted_through(day)] + [r["timestamp"] for r in day_records])
+
+    rollup = {
+        "initial": dict(kept[0]["initial"]),
+        "changes": sorted(records, key=lambda r: r["timestamp"]),
+        "last_state": dict(kept[-1]["last_state"]),
+        "period": "week",
+        "days": sorted(merged_days)
+    }
+    compact_day(rollup)
+    if through:
+        rollup["compacted_through"] = through
+    return rollup
+
+class RetentionEngine:
+    """Политика хранения: дневные дельты, недельные сводки и архивация старых дней"""
+    def __init__(self, compact_after_days=None, weekly_after_weeks=None, archive_after_days=None):
+        # Сегодняшний день всегда остаётся подробным
+        self.compact_after_days = max(int(compact_after_days), 1) if compact_after_days else None
+        self.weekly_after_weeks = max(int(weekly_after_weeks), 1) if weekly_after_weeks else None
+        self.archive_after_days = max(int(archive_after_days), 1) if archive_after_days else None
+
+    @classmethod
+    def from_config(cls, retention_config):
+        return cls(retention_config.get("compact_after_days"),
+                   retention_config.get("weekly_after_weeks"),
+                   retention_config.get("archive_after_days"))
+
+    @property
+    def enabled(self):
+        return bool(self.compact_after_days or self.weekly_after_weeks or self.archive_after_days)
+
+    def compact(self, history, today):
+        """Сжимает старые дни прямо в history, возвращает True при изменениях"""
+        changed = False
+
+        if self.compact_after_days:
+            border = (today - timedelta(days=self.compact_after_days)).strftime(DATE_KEY_FORMAT)
+            for date_key, day in history.items():
+                if date_key < border and compact_day(day):
+                    changed = True
+
+        if self.weekly_after_weeks:
+            border = today - timedelta(weeks=self.weekly_after_weeks)
+            weeks = defaultdict(list)
+            for date_key in sorted(history):
+                date = datetime.strptime(date_key, DATE_KEY_FORMAT).date()
+                week_start = date - timedelta(days=date.weekday())
+                if week_start + timedelta(days=7) <= border:
+                    weeks[week_start.strftime(DATE_KEY_FORMAT)].append((date_key, history[date_key]))
+
+            for week_key, days in weeks.items():
+                if len(days) == 1 and days[0][0] == week_key and days[0][1].get("period") == "week":
+                    continue
+                rollup = rollup_week(days)
+                for date_key, _ in days:
+                    del history[date_key]
+                history[week_key] = rollup
+                changed = True
+
+        return changed
+
+    def select_archive(self, history, today):
+        """Даты, которые пора перенести в архив"""
+        if not self.archive_after_days:
+            return []
+        border = (today - timedelta(days=self.archive_after_days)).strftime(DATE_KEY_FORMAT)
+        return [date_key for date_key in history if date_key < border]
+
+class HistoryArchive:
+    """Сжатые помесячные сегменты архивных дней, загружаемые по требованию"""
+    def __init__(self, directory=ARCHIVE_DIR, compression="gzip"):
+        self.directory = Path(directory)
+        self.index_path = self.directory / "index.json"
+        if compression == "zstd" and zstandard is None:
+            print("Модуль zstandard не установлен, архив будет сжат gzip")
+        self.extension = ".json.zst" if compression == "zstd" and zstandard else ".json.gz"
+        self.index = {}  # date_key -> {"segment": имя файла сегмента, "summary": сводка дня}
+        self.cache = OrderedDict()
+        self.lock = threading.RLock()
+
+    def __contains__(self, date_key):
+        return date_key in self.index
+
+    def dates(self):
+        return list(self.index)
+
+    def load_index(self):
+        try:
+            if self.index_path.exists():
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                # Старый формат индекса хранил только имя сегмента, без сводки
+                index = {date_key: entry if isinstance(entry, dict) else {"segment": entry}
+                         for date_key, entry in index.items()}
+                with self.lock:
+                    self.index = index
+                    self.cache.clear()
+        except Exception as e:
+            print(f"Ошибка при загрузке индекса архива: {e}")
+
+    def write_atomic(self, path, data):
+        tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def read_segment(self, name):
+        with open(self.directory / name, 'rb') as f:
+            data = f.read()
+        if name.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"Для чтения {name} нужен модуль zstandard")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+        return json.loads(data.decode('utf-8'))
+
+    def summaries(self):
+        """Сводки архивных дней из индекса; распаковываются только сегменты старого формата"""
+        with self.lock:
+            summaries = {date_key: entry.get("summary") for date_key, entry in self.index.items()}
+        missing = {date_key for date_key, summary in summaries.items() if summary is None}
+        if missing:
+            for date_key, day in self.iter_days(missing.__contains__):
+                summaries[date_key] = summarize_day(day)
+        return {date_key: summary for date_key, summary in summaries.items() if summary is not None}
+
+    def iter_days(self, wanted=None):
+        """Архивные дни по порядку дат; сегменты читаются по одному и не вытесняют кэш"""
+        segments = defaultdict(list)
+        with self.lock:
+            for date_key, entry in self.index.items():
+                if wanted is None or wanted(date_key):
+                    segments[entry["segment"]].append(date_key)
+        # Сегменты помесячные, так что порядок имён совпадает с порядком дат
+        for name in sorted(segments):
+            try:
+                segment = self.read_segment(name)
+            except Exception as e:
+                print(f"Ошибка чтения сегмента архива {name}: {e}")
+                continue
+            for date_key in sorted(segments[name]):
+                day = segment.get(date_key)
+                if day is not None:
+                    yield date_key, day
+
+    def get_day(self, date_key):
+        """Возвращает архивный день, распаковывая его сегмент при необходимости"""
+        with self.lock:
+            entry = self.index.get(date_key)
+            if entry is None:
+                return None
+            name = entry["segment"]
+            segment = self.cache.get(name)
+            if segment is None:
+                try:
+                    segment = self.read_segment(name)
+                except Exception as e:
+                    print(f"Ошибка чтения сегмента архива {name}: {e}")
+                    return None
+                self.cache[name] = segment
+                while len(self.cache) > ARCHIVE_CACHE_SEGMENTS:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(name)
+            return segment.get(date_key)
+
+    def add_days(self, days):
+        """Дописывает дни в сегменты по месяцам, объединяя с уже архивированными"""
+        months = defaultdict(dict)
+        for date_key, day in days.items():
+            months[date_key[:7]][date_key] = day
+
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            superseded = set()
+            for month, month_days in months.items():
+                name = month + self.extension
+                segment = {}
+                old_names = {entry["segment"] for k, entry in self.index.items() if k.startswith(month)}
+                for old_name in old_names:
+                    segment.update(self.read_segment(old_name))
+                # Дни, уже вошедшие в недельную сводку сегмента, повторно не архивируем
+                covered = {covered_key for week_key, week in segment.items() if week.get("period") == "week"
+                           for covered_key in week["days"] if covered_key != week_key}
+                for date_key, day in month_days.items():
+                    if date_key in covered:
+                        continue
+                    merge_history_day(segment, date_key, day)
+
+                payload = json.dumps(segment, ensure_ascii=False).encode('utf-8')
+                if name.endswith(".zst"):
+                    payload = zstandard.ZstdCompressor().compress(payload)
+                else:
+                    payload = gzip.compress(payload)
+                self.write_atomic(self.directory / name, payload)
+
+                for date_key, day in segment.items():
+                    self.index[date_key] = {"segment": name, "summary": summarize_day(day)}
+                superseded |= old_names - {name}
+                self.cache.pop(name, None)
+
+            # Индекс должен указывать на новые сегменты до удаления старых
+            self.write_atomic(self.index_path, json.dumps(self.index, indent=2).encode('utf-8'))
+            for old_name in superseded:
+                self.cache.pop(old_name, None)
+                try:
+                    os.remove(self.directory / old_name)
+                except OSError as e:
+                    print(f"Не удалось удалить старый сегмент архива {old_name}: {e}")
+
+class FileLock:
+    """Межпроцессная advisory-блокировка (fcntl в Linux/Mac, msvcrt в Windows)"""
+    def __init__(self, path, exclusive=True):
+        self.path = path
+        self.exclusive = exclusive
+        self.handle = None
+
+    def acquire(self, blocking=True):
+        handle = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                flags = fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH
+                if not blocking:
+                    flags |= fcntl.LOCK_NB
+                fcntl.flock(handle.fileno(), flags)
+            else:
+                # msvcrt не умеет разделяемые блокировки, в Windows все блокировки эксклюзивные
+                handle.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        time.sleep(0.1)
+        except OSError:
+            handle.close()
+            if blocking:
+                raise
+            return False
+        self.handle = handle
+        return True
+
+    def release(self):
+        if self.handle is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        self.handle.close()
+        self.handle = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class HistoryStore:
+    """Файл истории с одним писателем и многими читателями.
+
+    Запись идёт через временный файл и os.replace, поэтому читатели всегда
+    видят целый снимок. Номер версии снимка лежит рядом в файле .version,
+    все операции с файлами выполняются под блокировкой .lock. Право писать
+    получает только процесс, удерживающий блокировку .writer.
+    """
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.version_path = path + ".version"
+        self.writer_lock = FileLock(path + ".writer")
+        self.version = 0
+        self.is_writer = False
+        self.dirty = False
+        self.closing = False
+        self.cond = threading.Condition()
+        self.writer_thread = None
+
+    def acquire_writer(self):
+        """Пытается стать единственным писателем, False — режим только чтения"""
+        self.is_writer = self.writer_lock.acquire(blocking=False)
+        return self.is_writer
+
+    def read_version(self):
+        try:
+            with open(self.version_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def changed(self):
+        """Появилась ли на диске версия новее загруженной"""
+        return self.read_version() != self.version
+
+    def load(self):
+        """Читает согласованный снимок истории"""
+        try:
+            with FileLock(self.lock_path, exclusive=False):
+                version = self.read_version()
+                history = self.read_file()
+        except Exception:
+            # Версия неизвестна: следующая запись перечитает файл, а не затрёт его молча
+            self.version = -1
+            raise
+        self.version = version
+        return history
+
+    def read_file(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+        if not isinstance(history, dict):
+            raise ValueError("Неверный формат файла истории")
+        return history
+
+    def quarantine(self, error):
+        """Откладывает повреждённый файл истории в сторону, чтобы запись могла продолжиться"""
+        corrupt_path = f"{self.path}.corrupt-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        os.replace(self.path, corrupt_path)
+        print(f"Файл истории повреждён ({error}), сохранён как {corrupt_path}")
+        return corrupt_path
+
+    def write(self, history, history_lock, on_merge=None):
+        """Записывает историю, сначала объединив чужие изменения с диска"""
+        with FileLock(self.lock_path):
+            disk_version = self.read_version()
+            disk_history = {}
+            if disk_version != self.version:
+                try:
+                    disk_history = self.read_file()
+                except ValueError as e:
+                    self.quarantine(e)
+
+            with history_lock:
+                merged = False
+                for date_key, day in disk_history.items():
+                    try:
+                        day = validate_history_day(date_key, day)
+                    except ValueError as e:
+                        print(f"Пропущен день {date_key} из чужой версии: {e}")
+                        continue
+                    is_new = date_key not in history
+                    if merge_history_day(history, date_key, day) or is_new:
+                        merged = True
+                payload = json.dumps(history, indent=2, ensure_ascii=False)
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            version = max(disk_version, self.version) + 1
+            tmp_version = f"{self.version_path}.{os.getpid()}.tmp"
+            with open(tmp_version, 'w') as f:
+                f.write(str(version))
+            os.replace(tmp_version, self.version_path)
+            self.version = version
+
+        if merged and on_merge:
+            on_merge()
+
+    def start_writer(self, get_history, history_lock, on_merge=None):
+        """Запускает поток записи, который объединяет подряд идущие запросы"""
+        def writer_loop():
+            while True:
+                with self.cond:
+                    while not self.dirty and not self.closing:
+                        self.cond.wait()
+                    if not self.dirty:
+                        return
+                    self.dirty = False
+                try:
+                    self.write(get_history(), history_lock, on_merge)
+                except Exception as e:
+                    print(f"Ошибка при сохранении истории: {e}")
+
+        self.writer_thread = threading.Thread(target=writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def request_save(self):
+        with self.cond:
+            self.dirty = True
+            self.cond.notify()
+
+    def close(self, timeout=10):
+        """Дописывает очередь и освобождает право записи"""
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+        if self.writer_thread:
+            self.writer_thread.join(timeout)
+        self.writer_lock.release()
+        self.is_writer = False
+
+EVENT_QUEUE_SIZE = 1000  # Размер очереди событий по умолчанию для подписчика
+EVENT_POLICIES = ("drop_oldest", "drop_new", "block")
+
+class JsonlSink:
+    """Дописывает события изменений в JSONL-файл"""
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def close(self):
+        pass
+
+class SocketSink:
+    """Отправляет события построчно (JSONL) в локальный TCP-сокет"""
+    def __init__(self, host="127.0.0.1", port=8766, timeout=5):
+        self.address = (host, int(port))
+        self.timeout = timeout
+        self.sock = None
+
+    def __call__(self, event):
+        data = (json.dumps(event, ensure_ascii=False) + "\n").encode('utf-8')
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            # Переподключимся при следующем событии
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+class CommandSink:
+    """Запускает команду оболочки и передаёт ей событие в stdin"""
+    def __init__(self, command, timeout=30):
+        self.command = command
+        self.timeout = timeout
+
+    def __call__(self, event):
+        subprocess.run(self.command, shell=True, input=json.dumps(event, ensure_ascii=False),
+                       text=True, encoding='utf-8', timeout=self.timeout, check=False)
+
+    def close(self):
+        pass
+
+EVENT_SINKS = {
+    "jsonl": JsonlSink,
+    "socket": SocketSink,
+    "command": CommandSink
+}
+
+class EventSubscriber:
+    """Ограниченная очередь и поток доставки событий одному подписчику"""
+    def __init__(self, sink, max_queue=EVENT_QUEUE_SIZE, policy="drop_oldest", block_timeout=1.0):
+        if policy not in EVENT_POLICIES:
+            raise ValueError(f"Неизвестная политика очереди: {policy}")
+        self.sink = sink
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def offer(self, event):
+        """Ставит событие в очередь согласно политике переполнения"""
+        if self.policy == "block":
+            try:
+                self.queue.put(event, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+            return
+
+        try:
+            self.queue.put_nowait(event)
+            return
+        except queue.Full:
+            self.dropped += 1
+
+        if self.policy == "drop_oldest":
+            self.force_put(event)
+
+    def force_put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            try:
+                self.sink(event)
+            except Exception as e:
+                print(f"Ошибка доставки события в {type(self.sink).__name__}: {e}")
+        try:
+            close = getattr(self.sink, "close", None)
+            if close is not None:
+                close()
+        except Exception as e:
+            print(f"Ошибка закрытия {type(self.sink).__name__}: {e}")
+
+    def close(self, timeout=2):
+        self.force_put(None)
+        self.thread.join(timeout)
+
+class ChangeEventBus:
+    """Шина событий изменений инвентаря с асинхронными подписчиками"""
+    def __init__(self):
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, sink, **options):
+        subscriber = EventSubscriber(sink, **options)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.close()
+
+    def publish(self, events):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                subscriber.offer(event)
+
+    def close(self):
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def subscribe_from_config(self, sink_configs):
+        """Подключает встроенные приёмники из секции event_sinks конфигурации"""
+        for sink_config in sink_configs:
+            params = dict(sink_config)
+            sink_type = params.pop("type", None)
+            options = {key: params.pop(key) for key in ("max_queue", "policy", "block_timeout")
+                       if key in params}
+            if sink_type not in EVENT_SINKS:
+                print(f"Неизвестный тип приёмника событий: {sink_type}")
+                continue
+            try:
+                sink_class = EVENT_SINKS[sink_type]
+                self.subscribe(sink_class(**params), **options)
+            except Exception as e:
+                print(f"Не удалось подключить приёмник событий {sink_config}: {e}")
+
+class ItemRecord:
+    """Запись каталога: только используемые программой поля предмета"""
+    __slots__ = ("item_id", "name", "name_ru", "rarity", "item_type", "price")
+
+    def __init__(self, item_id, name, name_ru, rarity=None, item_type=None, price=None):
+        self.item_id = item_id
+        self.name = name
+        self.name_ru = name_ru
+        self.rarity = rarity
+        self.item_type = item_type
+        self.price = price
+
+    @property
+    def display_name(self):
+        return self.name_ru or self.name or f"ID {self.item_id}"
+
+class ItemCatalog:
+    """Каталог предметов с интернированными id и кэшем заглушек для неизвестных"""
+    def __init__(self):
+        self.records = {}
+        self.fallbacks = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, item_id):
+        return str(item_id) in self.records
+
+    def load(self, raw_items):
+        """Строит каталог из ответа ITEMS_API, возвращает число предметов"""
+        records = {}
+        for item in raw_items:
+            if not isinstance(item, dict):
+                continue
+            item_id = item.get('Itemdefid')
+            if item_id is None or item_id == '':
+                continue
+            item_id = sys.intern(str(item_id))
+            records[item_id] = ItemRecord(
+                item_id,
+                item.get('Name') or '',
+                item.get('NameRu') or '',
+                item.get('Rarity'),
+                item.get('Type'),
+                parse_price(item.get(CATALOG_PRICE_FIELD))
+            )
+        # Подменяем словари целиком, чтобы читатели из других потоков не видели полупустой каталог
+        self.records = records
+        self.fallbacks = {}
+        return len(records)
+
+    def get(self, item_id):
+        if not isinstance(item_id, str):
+            item_id = str(item_id)
+        record = self.records.get(item_id)
+        if record is None:
+            record = self.fallbacks.get(item_id)
+            if record is None:
+                item_id = sys.intern(item_id)
+                record = ItemRecord(item_id, f"Unknown (ID {item_id})", f"Неизвестно (ID {item_id})")
+                self.fallbacks[item_id] = record
+        return record
+
+    def lookup_names(self, item_ids):
+        """Возвращает список пар (name_ru, name) для массива id за один вызов"""
+        get = self.get
+        return [(record.name_ru, record.name) for record in map(get, item_ids)]
+
+    def prices(self):
+        """Цены предметов из каталога (только у кого они есть)"""
+        return {item_id: record.price for item_id, record in self.records.items()
+                if record.price is not None}
+
+def parse_price(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price >= 0 else None
+
+class PriceStore:
+    """Снимки цен по предметам, упорядоченные по дате"""
+    def __init__(self, path=PRICES_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.dates = {}  # item_id -> отсортированный список дат
+        self.prices = {}  # item_id -> array('d') цен, параллельный dates
+        self.lock = threading.RLock()
+        self.version = 0
+        self.file_stamp = None  # (mtime_ns, size) файла, который мы видели последним
+
+    def read_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        """Изменил ли файл цен другой процесс"""
+        return self.read_stamp() != self.file_stamp
+
+    def load(self):
+        try:
+            with FileLock(self.lock_path, exclusive=False):
+                stamp = self.read_stamp()
+                data = {}
+                if stamp is not None:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+            dates, prices = {}, {}
+            for item_id, snapshots in data.items():
+                snapshots = sorted(snapshots)
+                item_id = sys.intern(item_id)
+                dates[item_id] = [date_key for date_key, _ in snapshots]
+                prices[item_id] = array('d', (price for _, price in snapshots))
+            with self.lock:
+                self.dates, self.prices = dates, prices
+                self.file_stamp = stamp
+                self.version += 1
+        except Exception as e:
+            print(f"Ошибка при загрузке цен: {e}")
+
+    def save(self):
+        try:
+            with self.lock:
+                data = {item_id: list(zip(self.dates[item_id], self.prices[item_id]))
+                        for item_id in self.dates}
+            with FileLock(self.lock_path):
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self.file_stamp = self.read_stamp()
+        except Exception as e:
+            print(f"Ошибка при сохранении цен: {e}")
+
+    def add_snapshot(self, date_key, prices):
+        """Записывает цены на дату, возвращает число изменившихся снимков"""
+        changed = 0
+        with self.lock:
+            for item_id, price in prices.items():
+                item_id = sys.intern(str(item_id))
+                dates = self.dates.setdefault(item_id, [])
+                values = self.prices.setdefault(item_id, array('d'))
+                idx = bisect_right(dates, date_key)
+                if idx and dates[idx - 1] == date_key:
+                    if values[idx - 1] != price:
+                        values[idx - 1] = price
+                        changed += 1
+                elif not idx or values[idx - 1] != price:
+                    # Одинаковые подряд цены не храним
+                    dates.insert(idx, date_key)
+                    values.insert(idx, price)
+                    changed += 1
+            if changed:
+                self.version += 1
+        return changed
+
+    def import_file(self, file_path, default_date):
+        """Импорт цен из JSON: {id: цена} на default_date или {дата: {id: цена}}"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("Неверный формат файла цен")
+
+        snapshots = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                datetime.strptime(key, DATE_KEY_FORMAT)
+                snapshots[key] = value
+            else:
+                snapshots.setdefault(default_date, {})[key] = value
+
+        changed = 0
+        for date_key, prices in snapshots.items():
+            parsed = {item_id: parse_price(price) for item_id, price in prices.items()}
+            changed += self.add_snapshot(date_key, {item_id: price for item_id, price in parsed.items()
+                                                    if price is not None})
+        return changed
+
+    def prices_on(self, item_ids, date_key):
+        """Цены на дату для массива id; до первого снимка берётся самый ранний"""
+        result = array('d')
+        with self.lock:
+            for item_id in item_ids:
+                dates = self.dates.get(item_id)
+                if not dates:
+                    result.append(0.0)
+                    continue
+                idx = max(bisect_right(dates, date_key) - 1, 0)
+                result.append(self.prices[item_id][idx])
+        return result
+
+    def has_price(self, item_id):
+        return bool(self.dates.get(item_id))
+
+class ValuationEngine:
+    """Стоимость инвентаря по дням с кэшем дневных сводок"""
+    def __init__(self, price_store):
+        self.price_store = price_store
+        self.rollups = {}  # date_key -> (версия цен, сводка)
+        self.generation = 0  # Растёт при сбросе всего кэша
+        self.day_generations = {}  # date_key -> номер последнего сброса дня
+        self.lock = threading.Lock()
+
+    def invalidate(self, date_keys=None):
+        with self.lock:
+            if date_keys is None:
+                self.rollups.clear()
+                self.generation += 1
+            else:
+                for date_key in date_keys:
+                    self.rollups.pop(date_key, None)
+                    self.day_generations[date_key] = self.day_generations.get(date_key, 0) + 1
+
+    def day_generation(self, date_key):
+        return self.generation, self.day_generations.get(date_key, 0)
+
+    def cached_rollup(self, date_key):
+        """Готовая сводка дня при текущих ценах или None"""
+        version = self.price_store.version
+        with self.lock:
+            cached = self.rollups.get(date_key)
+        return cached[1] if cached and cached[0] == version else None
+
+    def day_rollup(self, date_key, day):
+        """Сводка дня: стоимость и её изменение по предметам и в сумме"""
+        version = self.price_store.version
+        with self.lock:
+            cached = self.rollups.get(date_key)
+            generation = self.day_generation(date_key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        item_ids = [item_id for item_id in set(day["initial"]).union(day["last_state"])
+                    if self.price_store.has_price(item_id)]
+        prices = self.price_store.prices_on(item_ids, date_key)
+        current = array('d', (day["last_state"].get(item_id, 0) for item_id in item_ids))
+        initial = array('d', (day["initial"].get(item_id, 0) for item_id in item_ids))
+        values = array('d', map(operator.mul, current, prices))
+        initial_values = array('d', map(operator.mul, initial, prices))
+
+        rollup = {
+            "total": sum(values),
+            "change": sum(values) - sum(initial_values),
+            "items": {item_id: (value, value - initial_value)
+                      for item_id, value, initial_value in zip(item_ids, values, initial_values)}
+        }
+        with self.lock:
+            # Не кэшируем сводку, если день сбросили, пока она считалась
+            if generation == self.day_generation(date_key) and version == self.price_store.version:
+                self.rollups[date_key] = (version, rollup)
+        return rollup
+
+    def portfolio_series(self, days):
+        """Итоговая стоимость инвентаря по дням из упорядоченных пар (дата, день)"""
+        return [{"date": date_key, "value": rollup["total"], "change": rollup["change"]}
+                for date_key, rollup in ((date_key, self.day_rollup(date_key, day))
+                                         for date_key, day in days)]
+
+API_SERVER_HOST = "127.0.0.1"
+API_SERVER_PORT = 8765
+CHANGE_STREAM_SIZE = 1000  # Сколько последних событий хранит поток изменений
+CHANGE_STREAM_MAX_WAIT = 30  # Максимальное ожидание long-poll запроса, сек
+API_CACHE_SIZE = 256  # Сколько готовых ответов API держать между записями истории
+
+class HistoryApiHandler(BaseHTTPRequestHandler):
+    server_version = "EggSurpriseTracker"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, body = self.server.api.handle(url.path.rstrip('/') or '/', parse_qs(url.query))
+        except Exception as e:
+            print(f"Ошибка API запроса {self.path}: {e}")
+            status, body = self.server.api.error(500, "Внутренняя ошибка сервера")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class HistoryApiServer:
+    """Встроенный HTTP/JSON сервер только для чтения истории из памяти"""
+    def __init__(self, tracker, host=API_SERVER_HOST, port=API_SERVER_PORT):
+        self.tracker = tracker
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.generation = 0
+        self.events = deque(maxlen=CHANGE_STREAM_SIZE)
+        self.event_seq = 0
+        self.events_cond = threading.Condition()
+        self.httpd = ThreadingHTTPServer((host, int(port)), HistoryApiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.api = self
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        with self.events_cond:
+            self.events_cond.notify_all()
+
+    def invalidate(self):
+        """Сбрасывает кэш ответов после записи истории"""
+        with self.cache_lock:
+            self.cache.clear()
+            self.generation += 1
+
+    def on_event(self, event):
+        """Приёмник шины событий: пополняет поток изменений"""
+        with self.events_cond:
+            self.event_seq += 1
+            self.events.append(dict(event, seq=self.event_seq))
+            self.events_cond.notify_all()
+
+    def handle(self, path, query):
+        if path == "/changes":
+            return self.respond(200, self.change_stream(query))
+
+        with self.cache_lock:
+            cached = self.cache.get(path)
+            if cached is not None:
+                self.cache.move_to_end(path)
+            generation = self.generation
+        if cached is not None:
+            return cached
+
+        # Блокировка истории берётся только на снимок рабочих дней, архив читается без неё
+        parts = path.strip('/').split('/')
+        if path == "/inventory":
+            result = self.respond(200, self.current_inventory())
+        elif path == "/days":
+            result = self.respond(200, self.day_summaries())
+        elif path == "/value":
+            result = self.respond(200, self.value_series())
+        elif len(parts) == 2 and parts[0] == "days":
+            day = self.day_details(parts[1])
+            result = self.respond(200, day) if day else self.error(404, f"Нет данных за {parts[1]}")
+        elif len(parts) == 2 and parts[0] == "items":
+            series = self.item_series(parts[1])
+            result = self.respond(200, series) if series else self.error(404, f"Нет данных о предмете {parts[1]}")
+        else:
+            return self.error(404, f"Неизвестный путь: {path}")
+
+        # Кэшируем только успешные ответы и только если история не менялась во время построения
+        if result[0] == 200:
+            with self.cache_lock:
+                if generation == self.generation:
+                    self.cache[path] = result
+                    while len(self.cache) > API_CACHE_SIZE:
+                        self.cache.popitem(last=False)
+        return result
+
+    def respond(self, status, data):
+        return status, json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def error(self, status, message):
+        return self.respond(status, {"error": message})
+
+    def item_names(self, item_id):
+        record = self.tracker.get_item_info(item_id)
+        return {"name": record.name, "name_ru": record.name_ru}
+
+    def current_inventory(self):
+        history = self.hot_days()
+        if not history:
+            return {"date": None, "items": {}}
+        date_key = max(history)
+        day = history[date_key]
+        items = {}
+        for item_id, count in day["last_state"].items():
+            initial = day["initial"].get(item_id, 0)
+            items[item_id] = dict(self.item_names(item_id), count=count,
+                                  initial=initial, change=count - initial)
+        return {"date": date_key, "items": items}
+
+    def hot_days(self, date_keys=None):
+        """Копия рабочих дней, снятая под блокировкой истории"""
+        with self.tracker.history_lock:
+            history = self.tracker.history
+            return {date_key: dict(day, initial=dict(day["initial"]), changes=list(day["changes"]),
+                                   last_state=dict(day["last_state"]))
+                    for date_key, day in history.items()
+                    if date_keys is None or date_key in date_keys}
+
+    def all_days(self, wanted=None):
+        """Все дни по порядку: рабочие из снимка, архивные по одному сегменту вне блокировки"""
+        hot = self.hot_days()
+        archived = self.tracker.archive.iter_days(
+            lambda date_key: date_key not in hot and (wanted is None or wanted(date_key)))
+        return heapq.merge(sorted(hot.items()), archived, key=lambda pair: pair[0])
+
+    def day_summaries(self):
+        summaries = self.tracker.archive.summaries()
+        summaries.update((date_key, summarize_day(day)) for date_key, day in self.hot_days().items())
+        return [dict(summaries[date_key], date=date_key) for date_key in sorted(summaries)]
+
+    def value_series(self):
+        """Стоимость по дням; архивные сегменты читаются только для дней без готовой сводки"""
+        valuation = self.tracker.valuation
+        cached = {}
+
+        def needs_rollup(date_key):
+            rollup = valuation.cached_rollup(date_key)
+            if rollup is not None:
+                cached[date_key] = {"date": date_key, "value": rollup["total"], "change": rollup["change"]}
+            return rollup is None
+
+        series = valuation.portfolio_series(self.all_days(needs_rollup))
+        series.extend(cached.values())
+        series.sort(key=lambda point: point["date"])
+        return series
+
+    def day_details(self, date_key):
+        day = self.hot_days({date_key}).get(date_key)
+        if day is None:
+            day = next((day for _, day in self.tracker.archive.iter_days({date_key}.__contains__)), None)
+        if day is None:
+            return None
+        item_ids = set(day["initial"]).union(day["last_state"])
+        net = {}
+        for item_id in item_ids:
+            delta = day["last_state"].get(item_id, 0) - day["initial"].get(item_id, 0)
+            if delta:
+                net[item_id] = delta
+        return {
+            "date": date_key,
+            "initial": day["initial"],
+            "last_state": day["last_state"],
+            "net_changes": net,
+            "changes": day["changes"]
+        }
+
+    def item_series(self, item_id):
+        """Ряд количества предмета или None, если его нет ни в одном дне"""
+        points = []
+        seen = False
+        for date_key, day in self.all_days():
+            seen = seen or item_id in day["initial"] or item_id in day["last_state"]
+            count = day["initial"].get(item_id, 0)
+            points.append({"timestamp": date_key, "count": count, "delta": 0})
+            for record in day["changes"]:
+                delta = record["changes"].get(item_id)
+                if delta:
+                    seen = True
+                    count += delta
+                    points.append({"timestamp": record["timestamp"], "count": count, "delta": delta})
+        if not seen:
+            return None
+        return dict(self.item_names(item_id), item_id=item_id, points=points)
+
+    def change_stream(self, query):
+        """События после seq=since; при wait>0 ждёт новые (long-poll)"""
+        try:
+            since = int(query.get("since", ["0"])[0])
+            wait = min(float(query.get("wait", ["0"])[0]), CHANGE_STREAM_MAX_WAIT)
+        except ValueError:
+            since, wait = 0, 0
+        with self.events_cond:
+            if wait > 0 and self.event_seq <= since:
+                self.events_cond.wait(wait)
+            events = [event for event in self.events if event["seq"] > since]
+            return {"last_seq": self.event_seq, "events": events}
 
 class AuthWindow:
     def __init__(self, root, on_auth_success):
@@ -114,8 +1443,10 @@ class AuthWindow:
     
     def save_token(self, token):
         try:
+            config = load_config()
+            config["token"] = token
             with open(CONFIG_FILE, 'w') as f:
-                json.dump({"token": token}, f)
+                json.dump(config, f, indent=2)
         except Exception as e:
             print(f"Ошибка сохранения токена: {e}")
 
@@ -124,8 +1455,15 @@ class InventoryTracker:
         self.root = root
         self.token = token
         self.history = {}
+        self.history_lock = threading.RLock()
+        self.store = HistoryStore(HISTORY_FILE)
+        self.retention_thread = None
+        self.import_thread = None
         self.current_inventory = None
-        self.items_info = {}
+        self.catalog = ItemCatalog()
+        self.price_store = PriceStore()
+        self.price_store.load()
+        self.valuation = ValuationEngine(self.price_store)
         self.tracking_active = False
         self.tracking_thread = None
         self.show_changed_only = False
@@ -133,14 +1471,34 @@ class InventoryTracker:
         self.sort_reverse = False
         self.search_query = tk.StringVar()
         self.selected_date = tk.StringVar(value=self.get_current_date_key())
+        self.account_id = hashlib.sha256(token.encode('utf-8')).hexdigest()[:12]
+        self.config = load_config()
+        self.event_bus = ChangeEventBus()
+        self.event_bus.subscribe_from_config(self.config.get("event_sinks", []))
+        self.api_server = None
+        retention_config = self.config.get("retention", {})
+        self.retention = RetentionEngine.from_config(retention_config)
+        self.archive = HistoryArchive(ARCHIVE_DIR, retention_config.get("compression", "gzip"))
+        self.archive.load_index()
         
         self.migrate_old_data()
+        self.read_only = not self.store.acquire_writer()
+        self.load_history()
+        if not self.read_only:
+            self.store.start_writer(lambda: self.history, self.history_lock,
+                                    on_merge=self.history_changed)
         self.setup_ui()
+        self.start_api_server(self.config.get("api_server", {}))
         self.load_items_info()
         self.refresh_data()  # Автоматическое обновление при запуске
         
         # Запускаем автообновление
         self.start_auto_refresh()
+        if self.read_only:
+            self.status("Трекер уже запущен в другом окне: режим только просмотра")
+            self.root.after(VIEWER_POLL_INTERVAL * 1000, self.poll_store)
+        elif self.retention.enabled:
+            self.schedule_retention()
 
     def start_auto_refresh(self):
         """Запускает автоматическое обновление данных"""
@@ -152,6 +1510,102 @@ class InventoryTracker:
             self.refresh_data()
             self.root.after(CHECK_INTERVAL * 1000, self.auto_refresh)
 
+    def schedule_retention(self):
+        """Периодически запускает сжатие и архивацию истории в фоне"""
+        if not (self.retention_thread and self.retention_thread.is_alive()):
+            self.retention_thread = threading.Thread(target=self.retention_worker, daemon=True)
+            self.retention_thread.start()
+        self.root.after(RETENTION_INTERVAL * 1000, self.schedule_retention)
+
+    def retention_worker(self):
+        """Сжимает старые дни и переносит их в архив, оставляя в памяти только свежие"""
+        today = datetime.now(TIMEZONE).date()
+        with self.history_lock:
+            compacted = self.retention.compact(self.history, today)
+            originals = {date_key: self.history[date_key]
+                         for date_key in self.retention.select_archive(self.history, today)}
+            # Копируем под блокировкой, чтобы импорт не менял дни во время записи архива
+            to_archive = json.loads(json.dumps(originals))
+            sizes = {date_key: len(day["changes"]) for date_key, day in originals.items()}
+
+        archived = 0
+        if to_archive:
+            try:
+                self.archive.add_days(to_archive)
+            except Exception as e:
+                print(f"Ошибка архивации истории: {e}")
+            else:
+                with self.history_lock:
+                    for date_key, day in originals.items():
+                        # День, изменённый после копирования, останется до следующего прохода
+                        if self.history.get(date_key) is day and len(day["changes"]) == sizes[date_key]:
+                            del self.history[date_key]
+                            archived += 1
+
+        if compacted or archived:
+            self.save_history()
+            self.history_changed()
+            self.post_status(f"История сжата, в архив перенесено дней: {archived}")
+            self.root.after(0, self.update_date_combobox)
+
+    def get_day(self, date_key):
+        """День из рабочей истории или, если его там нет, из архива"""
+        with self.history_lock:
+            day = self.history.get(date_key)
+        if day is None and date_key in self.archive:
+            day = self.archive.get_day(date_key)
+        return day
+
+    def date_keys(self):
+        with self.history_lock:
+            return sorted(set(self.history).union(self.archive.dates()))
+
+    def poll_store(self):
+        """Режим просмотра: перечитывает новые версии и ждёт, когда освободится право записи"""
+        if self.store.acquire_writer():
+            self.promote_to_writer()
+            return
+        if self.store.changed() or self.price_store.changed():
+            self.refresh_data()
+        self.root.after(VIEWER_POLL_INTERVAL * 1000, self.poll_store)
+
+    def promote_to_writer(self):
+        """Переводит окно просмотра в режим записи после закрытия основного трекера"""
+        # Берём свежий снимок, чтобы первая запись не затёрла данные прежнего писателя
+        self.load_history()
+        self.archive.load_index()
+        if self.price_store.changed():
+            self.price_store.load()
+        self.read_only = False
+        self.store.start_writer(lambda: self.history, self.history_lock,
+                                on_merge=self.history_changed)
+        self.history_changed()
+        if self.retention.enabled:
+            self.schedule_retention()
+        self.refresh_data()
+        self.status("Основной трекер закрыт: это окно теперь ведёт историю")
+
+    def start_api_server(self, server_config):
+        """Запускает HTTP API, если он включён в конфигурации"""
+        if not server_config.get("enabled"):
+            return
+        host = server_config.get("host", API_SERVER_HOST)
+        port = server_config.get("port", API_SERVER_PORT)
+        try:
+            self.api_server = HistoryApiServer(self, host, port)
+        except OSError as e:
+            print(f"Не удалось запустить API сервер на {host}:{port}: {e}")
+            return
+        self.api_server.start()
+        self.event_bus.subscribe(self.api_server.on_event)
+        self.debug_print(f"API сервер запущен на http://{host}:{port}")
+
+    def history_changed(self, date_keys=None):
+        """Вызывается после каждой записи истории (date_keys=None — изменилось всё)"""
+        self.valuation.invalidate(date_keys)
+        if self.api_server:
+            self.api_server.invalidate()
+
     def migrate_old_data(self):
         """Переносит старые файлы из текущей директории в AppData"""
         old_files = {
@@ -159,13 +1613,14 @@ class InventoryTracker:
             OLD_HISTORY_FILE: HISTORY_FILE
         }
         
-        for old_name, new_path in old_files.items():
-            if os.path.exists(old_name) and not os.path.exists(new_path):
-                try:
-                    shutil.move(old_name, new_path)
-                    print(f"Перенесён {old_name} -> {new_path}")
-                except Exception as e:
-                    print(f"Ошибка переноса {old_name}: {e}")
+        with FileLock(self.store.lock_path):
+            for old_name, new_path in old_files.items():
+                if os.path.exists(old_name) and not os.path.exists(new_path):
+                    try:
+                        shutil.move(old_name, new_path)
+                        print(f"Перенесён {old_name} -> {new_path}")
+                    except Exception as e:
+                        print(f"Ошибка переноса {old_name}: {e}")
 
     def get_current_date_key(self):
         return datetime.now(TIMEZONE).strftime("%Y-%m-%d")
@@ -229,6 +1684,10 @@ class InventoryTracker:
                               command=self.show_import_dialog, style='TButton')
         import_btn.pack(side=tk.LEFT, padx=5)
         
+        prices_btn = ttk.Button(tool_frame, text="💰 Импорт цен", 
+                              command=self.show_price_import_dialog, style='TButton')
+        prices_btn.pack(side=tk.LEFT, padx=5)
+        
         self.filter_btn = ttk.Button(tool_frame, text="👁️ Показать все", 
                               command=self.toggle_filter, style='TButton')
         self.filter_btn.pack(side=tk.LEFT, padx=5)
@@ -266,7 +1725,7 @@ class InventoryTracker:
         sort_frame.pack(side=tk.RIGHT, padx=5)
         ttk.Label(sort_frame, text="Сортировка:").pack(side=tk.LEFT)
         self.sort_combo = ttk.Combobox(sort_frame, 
-                                     values=["Название", "ID", "Количество", "Изменение"], 
+                                     values=["Название", "ID", "Количество", "Изменение", "Стоимость"], 
                                      state="readonly")
         self.sort_combo.pack(side=tk.LEFT, padx=5)
         self.sort_combo.set("Количество")
@@ -276,7 +1735,8 @@ class InventoryTracker:
         self.tree_frame.pack(fill=tk.BOTH, expand=True)
         
         self.tree = ttk.Treeview(self.tree_frame, 
-                               columns=("id", "name_ru", "name_en", "initial", "current", "change"), 
+                               columns=("id", "name_ru", "name_en", "initial", "current", "change",
+                                        "value", "value_change"), 
                                show="headings")
         
         self.tree.heading("id", text="ID", command=lambda: self.sort_by_column("id"))
@@ -297,6 +1757,12 @@ class InventoryTracker:
         self.tree.heading("change", text="Изменение", command=lambda: self.sort_by_column("change"))
         self.tree.column("change", width=100, anchor=tk.CENTER)
         
+        self.tree.heading("value", text="Стоимость", command=lambda: self.sort_by_column("value"))
+        self.tree.column("value", width=100, anchor=tk.CENTER)
+        
+        self.tree.heading("value_change", text="Изм. стоимости", command=lambda: self.sort_by_column("value_change"))
+        self.tree.column("value_change", width=110, anchor=tk.CENTER)
+        
         self.tree.tag_configure('evenrow', background='#f8f8f8')
         self.tree.tag_configure('oddrow', background='#ffffff')
         self.tree.tag_configure('positive', foreground='green')
@@ -308,61 +1774,156 @@ class InventoryTracker:
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         self.status_var = tk.StringVar()
+        self.value_var = tk.StringVar()
         status_bar = ttk.Frame(main_frame)
         status_bar.pack(fill=tk.X, pady=(5,0))
+        ttk.Label(status_bar, textvariable=self.value_var, 
+                 background='#2c4d7f', foreground='white',
+                 anchor=tk.E, padding=5).pack(side=tk.RIGHT)
         ttk.Label(status_bar, textvariable=self.status_var, 
                  background='#2c4d7f', foreground='white',
                  anchor=tk.W, padding=5).pack(fill=tk.X)
 
     def show_import_dialog(self):
-        """Показывает диалог выбора файла для импорта"""
+        """Показывает диалог выбора файлов для импорта"""
+        file_paths = filedialog.askopenfilenames(
+            title="Выберите файлы истории",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if file_paths:
+            self.import_history(file_paths)
+
+    def import_history(self, file_paths):
+        """Запускает фоновый импорт файлов истории с объединением"""
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+
+        if self.read_only:
+            messagebox.showwarning("Режим просмотра", "Импорт доступен только в основном окне трекера")
+            return
+
+        if self.import_thread and self.import_thread.is_alive():
+            messagebox.showwarning("Импорт", "Импорт уже выполняется")
+            return
+
+        self.import_thread = threading.Thread(target=self.import_worker,
+                                              args=(list(file_paths),), daemon=True)
+        self.import_thread.start()
+
+    def import_worker(self, file_paths):
+        """Потоково читает файлы, проверяет дни и объединяет их с историей"""
+        sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in file_paths}
+        total_size = sum(sizes.values()) or 1
+        done_size = 0
+        last_percent = -1
+        stats = {"days": 0, "new_days": 0, "records": 0, "invalid": 0}
+        errors = []
+
+        for path in file_paths:
+            name = os.path.basename(path)
+            try:
+                for date_key, day, bytes_read in iter_history_file(path):
+                    try:
+                        day = validate_history_day(date_key, day)
+                    except ValueError as e:
+                        stats["invalid"] += 1
+                        errors.append(f"{name}: {e}")
+                        continue
+
+                    with self.history_lock:
+                        if date_key not in self.history:
+                            stats["new_days"] += 1
+                        stats["records"] += merge_history_day(self.history, date_key, day)
+                    stats["days"] += 1
+
+                    percent = (done_size + bytes_read) * 100 // total_size
+                    if percent != last_percent:
+                        last_percent = percent
+                        self.post_status(f"Импорт {name}: {percent}%")
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+            done_size += sizes[path]
+
+        if stats["days"]:
+            self.save_history()
+            self.history_changed()
+        self.root.after(0, self.finish_import, stats, errors)
+
+    def finish_import(self, stats, errors):
+        """Обновляет интерфейс после завершения импорта"""
+        self.update_date_combobox()
+        self.update_inventory_display()
+
+        message = (f"Обработано дней: {stats['days']}\n"
+                   f"Новых дней: {stats['new_days']}\n"
+                   f"Новых записей изменений: {stats['records']}")
+        if stats["invalid"]:
+            message += f"\nПропущено некорректных дней: {stats['invalid']}"
+        self.status(f"Импорт завершён: {stats['days']} дней, {stats['records']} новых записей")
+
+        if errors:
+            shown = "\n".join(errors[:10])
+            if len(errors) > 10:
+                shown += f"\n... и ещё {len(errors) - 10}"
+            messagebox.showwarning("Импорт завершён с ошибками", f"{message}\n\n{shown}")
+        else:
+            messagebox.showinfo("Успех", message)
+
+    def show_price_import_dialog(self):
+        """Показывает диалог выбора файла цен"""
         file_path = filedialog.askopenfilename(
-            title="Выберите файл истории",
+            title="Выберите файл цен",
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
         )
         if file_path:
-            self.import_history(file_path)
+            self.import_prices(file_path)
 
-    def import_history(self, file_path):
-        """Полностью заменяет текущую историю на импортированную"""
+    def import_prices(self, file_path):
+        """Добавляет снимки цен из файла"""
+        if self.read_only:
+            messagebox.showwarning("Режим просмотра", "Импорт цен доступен только в основном окне трекера")
+            return
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                imported_data = json.load(f)
-                
-            if not isinstance(imported_data, dict):
-                raise ValueError("Неверный формат файла истории")
-            
-            # Полная замена истории
-            self.history = imported_data
-            self.save_history()
-            
-            # Обновляем интерфейс
-            self.update_date_combobox()
+            changed = self.price_store.import_file(file_path, self.get_current_date_key())
+            if changed:
+                self.price_store.save()
+                self.history_changed()
             self.update_inventory_display()
-            
-            messagebox.showinfo("Успех", "История полностью заменена")
+            messagebox.showinfo("Успех", f"Обновлено снимков цен: {changed}")
         except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось импортировать: {str(e)}")
+            messagebox.showerror("Ошибка", f"Не удалось импортировать цены: {str(e)}")
 
     def on_close(self):
         """Обработчик закрытия окна"""
-        self.stop_tracking()
+        self.shutdown()
         self.root.destroy()
 
+    def shutdown(self):
+        """Останавливает фоновые службы"""
+        self.stop_tracking()
+        if self.api_server:
+            self.api_server.stop()
+        self.event_bus.close()
+        self.store.close()
+
     def logout(self):
         """Выход из аккаунта"""
-        self.stop_tracking()
-        if os.path.exists(CONFIG_FILE):
+        self.shutdown()
+        # Удаляем только токен, остальные настройки сохраняем
+        config = load_config()
+        if "token" in config:
             try:
-                os.remove(CONFIG_FILE)
+                config.pop("token")
+                with open(CONFIG_FILE, 'w') as f:
+                    json.dump(config, f, indent=2)
             except Exception as e:
-                print(f"Ошибка удаления файла конфигурации: {e}")
+                print(f"Ошибка удаления токена из конфигурации: {e}")
         self.root.destroy()
         # Перезапускаем приложение
         main()
 
     def update_date_combobox(self):
-        dates = sorted(self.history.keys(), reverse=True)
+        dates = self.date_keys()[::-1]
         if dates:
             self.date_combo['values'] = dates
             if not self.selected_date.get() in dates:
@@ -375,14 +1936,14 @@ class InventoryTracker:
         self.update_inventory_display()
 
     def prev_day(self):
-        dates = sorted(self.history.keys())
+        dates = self.date_keys()
         current_idx = dates.index(self.selected_date.get()) if self.selected_date.get() in dates else -1
         if current_idx > 0:
             self.selected_date.set(dates[current_idx - 1])
             self.update_inventory_display()
 
     def next_day(self):
-        dates = sorted(self.history.keys())
+        dates = self.date_keys()
         current_idx = dates.index(self.selected_date.get()) if self.selected_date.get() in dates else -1
         if current_idx < len(dates) - 1:
             self.selected_date.set(dates[current_idx + 1])
@@ -393,7 +1954,8 @@ class InventoryTracker:
             "Название": "name_ru",
             "ID": "id",
             "Количество": "current",
-            "Изменение": "change"
+            "Изменение": "change",
+            "Стоимость": "value"
         }
         self.sort_column = sort_options.get(self.sort_combo.get(), "current")
         self.update_inventory_display()
@@ -420,29 +1982,29 @@ class InventoryTracker:
         self.status_var.set(message)
         self.root.update_idletasks()
 
+    def post_status(self, message):
+        """Обновляет статус из фонового потока"""
+        self.root.after(0, self.status, message)
+
     def debug_print(self, message, data=None):
         print(f"[DEBUG] {message}")
 
     def load_history(self):
         try:
-            if os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                    self.history = json.load(f)
-                self.debug_print("История загружена из файла")
-            else:
-                self.history = {}
-                self.debug_print("Файл истории не найден, создана новая история")
+            history = self.store.load()
+            with self.history_lock:
+                self.history = history
+            self.debug_print(f"История загружена из файла (версия {self.store.version})")
         except Exception as e:
             print(f"Ошибка при загрузке истории: {e}")
-            self.history = {}
+            with self.history_lock:
+                self.history = {}
 
     def save_history(self):
-        try:
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
-            self.debug_print("История сохранена в файл")
-        except Exception as e:
-            print(f"Ошибка при сохранении истории: {e}")
+        """Ставит историю в очередь на запись; в режиме просмотра ничего не пишет"""
+        if self.read_only:
+            return
+        self.store.request_save()
 
     def make_api_request(self, url):
         headers = {
@@ -471,23 +2033,18 @@ class InventoryTracker:
         data = self.make_api_request(ITEMS_API)
         if data and isinstance(data, list):
             self.debug_print(f"Получено {len(data)} предметов из API")
-            for item in data:
-                item_id = str(item.get('Itemdefid', ''))
-                if item_id:
-                    self.items_info[item_id] = item
-            self.status(f"Загружена информация о {len(self.items_info)} предметах")
+            count = self.catalog.load(data)
+            # Снимки цен пишет только основной трекер, просмотр перечитывает файл
+            if not self.read_only and self.price_store.add_snapshot(self.get_current_date_key(),
+                                                                    self.catalog.prices()):
+                self.price_store.save()
+                self.history_changed([self.get_current_date_key()])
+            self.status(f"Загружена информация о {count} предметах")
         else:
             self.status("Не удалось загрузить информацию о предметах")
 
     def get_item_info(self, item_id):
-        item_id_str = str(item_id)
-        if item_id_str in self.items_info:
-            return self.items_info[item_id_str]
-        return {
-            "Name": f"Unknown (ID {item_id})",
-            "NameRu": f"Неизвестно (ID {item_id})",
-            "Itemdefid": item_id
-        }
+        return self.catalog.get(item_id)
 
     def process_inventory(self, inventory_data):
         if inventory_data is None:
@@ -504,7 +2061,7 @@ class InventoryTracker:
                 print(f"Пропущен невалидный предмет: {item}")
                 continue
                 
-            item_id = str(item.get('TypeId', ''))
+            item_id = sys.intern(str(item.get('TypeId', '')))
             if not item_id:
                 print(f"Пропущен предмет без TypeId: {item}")
                 continue
@@ -554,6 +2111,25 @@ class InventoryTracker:
             self.status("Ошибка: current_inventory не загружен")
             return
 
+        with self.history_lock:
+            events, change_messages = self.record_changes(date_key)
+
+        # Tk вызываем только после освобождения блокировки истории
+        if change_messages:
+            self.status(f"Обнаружены изменения в инвентаре:\n" + "\n".join(change_messages))
+        self.save_history()
+        self.history_changed([date_key])
+        if events:
+            self.event_bus.publish(events)
+        self.update_inventory_display()
+
+    def record_changes(self, date_key):
+        """Записывает разницу между последним и текущим состоянием дня.
+
+        Возвращает события и строки сообщения для строки состояния.
+        """
+        events = []
+        change_messages = []
         # Инициализируем день, если нужно
         if date_key not in self.history:
             self.history[date_key] = {
@@ -565,6 +2141,7 @@ class InventoryTracker:
             # Обновляем последнее состояние
             last_state = self.history[date_key]["last_state"]
             changes = {}
+            timestamp = datetime.now(TIMEZONE).isoformat()
 
             all_item_ids = set(last_state.keys()).union(set(self.current_inventory.keys()))
             
@@ -574,30 +2151,34 @@ class InventoryTracker:
                 
                 if old_count != new_count:
                     changes[item_id] = new_count - old_count
+                    events.append({
+                        "item_id": item_id,
+                        "delta": new_count - old_count,
+                        "before": old_count,
+                        "after": new_count,
+                        "timestamp": timestamp,
+                        "date": date_key,
+                        "account": self.account_id
+                    })
 
             if changes:
                 change_record = {
-                    "timestamp": datetime.now(TIMEZONE).isoformat(),
+                    "timestamp": timestamp,
                     "changes": changes
                 }
                 self.history[date_key]["changes"].append(change_record)
                 self.history[date_key]["last_state"] = self.current_inventory.copy()
                 
-                change_messages = []
                 for item_id, delta in changes.items():
-                    item_info = self.get_item_info(item_id)
-                    name = item_info.get('NameRu', item_info.get('Name', f'ID {item_id}'))
+                    name = self.get_item_info(item_id).display_name
                     initial_count = self.history[date_key]["initial"].get(item_id, 0)
                     current_count = self.current_inventory.get(item_id, 0)
                     
                     change_messages.append(
                         f"- {name}: {delta:+d} (было: {initial_count}, сейчас: {current_count})"
                     )
-                
-                self.status(f"Обнаружены изменения в инвентаре:\n" + "\n".join(change_messages))
 
-        self.save_history()
-        self.update_inventory_display()
+        return events, change_messages
 
     def update_inventory_display(self):
         if not self.current_inventory:
@@ -609,18 +2190,24 @@ class InventoryTracker:
         search_term = self.search_query.get().lower()
         date_key = self.selected_date.get()
         
-        if date_key not in self.history:
+        day = self.get_day(date_key)
+        if day is None:
             self.status(f"Нет данных за {date_key}")
             return
+        if day.get("period") == "week":
+            self.status(f"Недельная сводка: {day['days'][0]} — {day['days'][-1]}")
             
-        initial_inventory = self.history[date_key]["initial"]
-        current_inventory = self.history[date_key]["last_state"]
+        initial_inventory = day["initial"]
+        current_inventory = day["last_state"]
         
+        item_ids = list(current_inventory)
+        names = self.catalog.lookup_names(item_ids)
+        rollup = self.valuation.day_rollup(date_key, day)
+        item_values = rollup["items"]
+
         items_data = []
-        for item_id, current_count in current_inventory.items():
-            item_info = self.get_item_info(item_id)
-            name_ru = item_info.get('NameRu', '')
-            name_en = item_info.get('Name', '')
+        for item_id, (name_ru, name_en) in zip(item_ids, names):
+            current_count = current_inventory[item_id]
             
             if search_term and search_term not in name_ru.lower() and search_term not in name_en.lower() and search_term not in item_id.lower():
                 continue
@@ -630,6 +2217,8 @@ class InventoryTracker:
                 
             if self.show_changed_only and change == 0:
                 continue
+            
+            value, value_change = item_values.get(item_id, (None, None))
                 
             items_data.append({
                 "id": item_id,
@@ -637,7 +2226,9 @@ class InventoryTracker:
                 "name_en": name_en,
                 "initial": initial_count,
                 "current": current_count,
-                "change": change
+                "change": change,
+                "value": value,
+                "value_change": value_change
             })
         
         reverse_sort = self.sort_reverse
@@ -647,6 +2238,10 @@ class InventoryTracker:
                 items_data.sort(key=lambda x: (-x["change"] if x["change"] > 0 else float('inf') - x["change"]))
             else:
                 items_data.sort(key=lambda x: (x["change"] if x["change"] < 0 else float('inf') + x["change"]))
+        elif self.sort_column in ("value", "value_change"):
+            # Предметы без цены всегда в конце
+            items_data.sort(key=lambda x: (x[self.sort_column] is None,
+                                           -(x[self.sort_column] or 0) if reverse_sort else (x[self.sort_column] or 0)))
         else:
             items_data.sort(key=lambda x: x[self.sort_column], reverse=reverse_sort)
         
@@ -657,7 +2252,9 @@ class InventoryTracker:
                 item["name_en"],
                 item["initial"],
                 item["current"],
-                f"{item['change']:+d}" if item["change"] != 0 else ""
+                f"{item['change']:+d}" if item["change"] != 0 else "",
+                f"{item['value']:.2f}" if item["value"] is not None else "",
+                f"{item['value_change']:+.2f}" if item["value_change"] else ""
             )
             
             tags = ('evenrow',) if idx % 2 == 0 else ('oddrow',)
@@ -670,9 +2267,18 @@ class InventoryTracker:
                 self.tree.insert("", tk.END, values=values, tags=tags)
             except Exception as e:
                 print(f"Ошибка при добавлении предмета в таблицу: {e}")
+        
+        if rollup["items"]:
+            self.value_var.set(f"💰 {rollup['total']:.2f} ({rollup['change']:+.2f})")
+        else:
+            self.value_var.set("")
 
     def refresh_data(self):
         """Обновляет данные инвентаря"""
+        if self.read_only:
+            self.refresh_from_store()
+            return
+
         self.status("Обновление данных...")
         
         inventory_data = self.fetch_inventory()
@@ -690,6 +2296,23 @@ class InventoryTracker:
         self.load_items_info()
         self.update_inventory_display()
 
+    def refresh_from_store(self):
+        """Режим просмотра: показывает последний снимок истории писателя"""
+        if self.store.changed() or not self.history:
+            self.load_history()
+            self.archive.load_index()
+            self.history_changed()
+        if self.price_store.changed():
+            # Версия цен растёт при загрузке, кэш стоимости пересчитается сам
+            self.price_store.load()
+        with self.history_lock:
+            if self.history:
+                self.current_inventory = self.history[max(self.history)]["last_state"].copy()
+        if not self.catalog.records:
+            self.load_items_info()
+        self.update_date_combobox()
+        self.update_inventory_display()
+
     def toggle_tracking(self):
         if self.tracking_active:
             self.stop_tracking()
@@ -699,6 +2322,9 @@ class InventoryTracker:
     def start_tracking(self):
         if self.tracking_active:
             return
+        if self.read_only:
+            messagebox.showwarning("Режим просмотра", "Отслеживание уже ведёт другой запущенный трекер")
+            return
             
         self.tracking_active = True
         self.track_btn.config(text="⏹️ Стоп отслеживания")
@@ -725,7 +2351,7 @@ class InventoryTracker:
         try:
             export_file = "inventory_export_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".csv"
             with open(export_file, 'w', encoding='utf-8') as f:
-                f.write("ID;Название (RU);Название (EN);Начало дня;Текущее;Изменение\n")
+                f.write("ID;Название (RU);Название (EN);Начало дня;Текущее;Изменение;Стоимость;Изм. стоимости\n")
                 
                 for item in self.tree.get_children():
                     values = self.tree.item(item, 'values')
@@ -740,6 +2366,18 @@ class InventoryTracker:
     def run(self):
         self.root.mainloop()
 
+def load_config():
+    """Читает config.json, при ошибке возвращает пустую конфигурацию"""
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+            if isinstance(config, dict):
+                return config
+        except Exception as e:
+            print(f"Ошибка чтения конфигурации: {e}")
+    return {}
+
 def load_saved_token():
     if os.path.exists(CONFIG_FILE):
         try:
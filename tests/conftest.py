@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# CONFIG_DIR строится из APPDATA при импорте, вне Windows его нет
+os.environ.setdefault("APPDATA", tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,117 @@
+import json
+import threading
+
+import pytest
+
+import egg_final as ef
+
+
+class FakeTracker:
+    """Минимум InventoryTracker, который читает HistoryApiServer"""
+    get_day = ef.InventoryTracker.get_day
+    date_keys = ef.InventoryTracker.date_keys
+
+    def __init__(self, tmp_path):
+        self.history_lock = threading.RLock()
+        self.history = {
+            "2024-01-01": {
+                "initial": {"1": 1},
+                "changes": [{"timestamp": "2024-01-01T10:00:00+03:00", "changes": {"1": 2}}],
+                "last_state": {"1": 3}
+            }
+        }
+        self.archive = ef.HistoryArchive(tmp_path / "archive")
+        self.catalog = ef.ItemCatalog()
+        self.valuation = ef.ValuationEngine(ef.PriceStore(str(tmp_path / "prices.json")))
+
+    def get_item_info(self, item_id):
+        return self.catalog.get(item_id)
+
+
+@pytest.fixture
+def api(tmp_path):
+    server = ef.HistoryApiServer(FakeTracker(tmp_path), port=0)
+    yield server
+    server.httpd.server_close()
+
+
+def get(api, path):
+    status, body = api.handle(path, {})
+    return status, json.loads(body)
+
+
+def test_routes(api):
+    assert get(api, "/inventory")[1]["items"]["1"]["count"] == 3
+    assert [d["date"] for d in get(api, "/days")[1]] == ["2024-01-01"]
+    assert get(api, "/days/2024-01-01")[1]["net_changes"] == {"1": 2}
+    assert [p["count"] for p in get(api, "/items/1")[1]["points"]] == [1, 3]
+
+
+def test_only_successful_known_routes_are_cached(api):
+    for path in ("/days/2023-01-01", "/items/999", "/unknown"):
+        assert get(api, path)[0] == 404
+    get(api, "/days")
+    assert list(api.cache) == ["/days"]
+
+
+def test_cache_is_bounded(api, monkeypatch):
+    monkeypatch.setattr(ef, "API_CACHE_SIZE", 2)
+    for path in ("/days", "/inventory", "/items/1", "/days/2024-01-01"):
+        get(api, path)
+    assert list(api.cache) == ["/items/1", "/days/2024-01-01"]
+
+
+def test_write_invalidates_cache(api):
+    get(api, "/inventory")
+    api.tracker.history["2024-01-02"] = {"initial": {}, "changes": [], "last_state": {"2": 1}}
+    assert get(api, "/inventory")[1]["date"] == "2024-01-01"
+    api.invalidate()
+    assert get(api, "/inventory")[1]["date"] == "2024-01-02"
+
+
+def archive_day(api):
+    api.tracker.archive.add_days({"2023-12-31": {
+        "initial": {"1": 4},
+        "changes": [{"timestamp": "2023-12-31T10:00:00+03:00", "changes": {"1": -3}}],
+        "last_state": {"1": 1}
+    }})
+
+
+def test_day_list_uses_archive_index_summaries(api, monkeypatch):
+    archive_day(api)
+    monkeypatch.setattr(ef.HistoryArchive, "read_segment", lambda self, name: pytest.fail("сегмент распакован"))
+    days = get(api, "/days")[1]
+    assert [d["date"] for d in days] == ["2023-12-31", "2024-01-01"]
+    assert days[0]["lost"] == 3
+
+
+def test_archive_is_read_outside_history_lock(api, monkeypatch):
+    archive_day(api)
+    read_segment = ef.HistoryArchive.read_segment
+    lock_free = []
+
+    def try_history_lock():
+        if api.tracker.history_lock.acquire(timeout=0):
+            api.tracker.history_lock.release()
+            lock_free.append(True)
+        else:
+            lock_free.append(False)
+
+    def checked_read(self, name):
+        # Из другого потока блокировка истории должна быть свободна
+        thread = threading.Thread(target=try_history_lock)
+        thread.start()
+        thread.join()
+        return read_segment(self, name)
+
+    monkeypatch.setattr(ef.HistoryArchive, "read_segment", checked_read)
+    assert [p["count"] for p in get(api, "/items/1")[1]["points"]] == [4, 1, 1, 3]
+    assert [v["date"] for v in get(api, "/value")[1]] == ["2023-12-31", "2024-01-01"]
+    assert get(api, "/days/2023-12-31")[1]["net_changes"] == {"1": -3}
+    assert lock_free == [True] * 3
+    assert not api.tracker.archive.cache
+
+    # Сводки стоимости уже посчитаны, повторный запрос архив не распаковывает
+    api.invalidate()
+    get(api, "/value")
+    assert len(lock_free) == 3
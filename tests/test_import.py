@@ -0,0 +1,135 @@
+import copy
+import json
+
+import pytest
+
+import egg_final as ef
+
+HISTORY = {
+    "2024-01-01": {
+        "initial": {"1": 5, "2": 1},
+        "changes": [
+            {"timestamp": "2024-01-01T10:00:00+03:00", "changes": {"1": 2}},
+            {"timestamp": "2024-01-01T11:00:00+03:00", "changes": {"2": -1}}
+        ],
+        "last_state": {"1": 7, "2": 0}
+    },
+    "2024-01-02": {
+        "initial": {"1": 7},
+        "changes": [{"timestamp": "2024-01-02T09:30:00+03:00", "changes": {"1": 1}}],
+        "last_state": {"1": 8, "3": 1}
+    }
+}
+
+
+def write(tmp_path, data):
+    path = tmp_path / "history.json"
+    path.write_bytes(data if isinstance(data, bytes) else data.encode("utf-8"))
+    return str(path)
+
+
+def read_all(path, chunk_size=ef.IMPORT_CHUNK_SIZE):
+    return {date_key: day for date_key, day, _ in ef.iter_history_file(path, chunk_size)}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 4096])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_small_chunks_round_trip(tmp_path, chunk_size, indent):
+    path = write(tmp_path, json.dumps(HISTORY, indent=indent, ensure_ascii=False))
+    assert read_all(path, chunk_size) == HISTORY
+
+
+def test_bytes_read_reaches_file_size(tmp_path):
+    data = json.dumps(HISTORY, indent=2)
+    path = write(tmp_path, data)
+    progress = [bytes_read for _, _, bytes_read in ef.iter_history_file(path, 16)]
+    assert progress == sorted(progress)
+    assert progress[-1] <= len(data.encode("utf-8"))
+
+
+def test_utf8_bom_is_skipped(tmp_path):
+    path = write(tmp_path, b"\xef\xbb\xbf" + json.dumps(HISTORY).encode("utf-8"))
+    assert read_all(path, 3) == HISTORY
+
+
+@pytest.mark.parametrize("data", ["{}", "  { }\n"])
+def test_empty_object(tmp_path, data):
+    assert read_all(write(tmp_path, data)) == {}
+
+
+@pytest.mark.parametrize("data", [
+    '{"2024-01-01": {},}',           # висячая запятая
+    '{"2024-01-01": {"initial": {}',  # обрезанный файл
+    '{"2024-01-01": ',
+    '{"2024-01-01"',
+    '{',
+    '',
+    '[]',
+    '{"2024-01-01": {}} {"x": 1}',   # лишние данные после конца
+    '{"2024-01-01": {}}garbage',
+])
+def test_malformed_input_raises(tmp_path, data):
+    with pytest.raises(ValueError):
+        read_all(write(tmp_path, data), 4)
+
+
+def test_trailing_whitespace_is_allowed(tmp_path):
+    path = write(tmp_path, json.dumps(HISTORY) + "\n\n  ")
+    assert read_all(path, 5) == HISTORY
+
+
+@pytest.mark.parametrize("date_key, day", [
+    ("2024-13-01", {"initial": {}}),
+    ("2024-01-01", []),
+    ("2024-01-01", {"initial": {"1": "5"}}),
+    ("2024-01-01", {"initial": {"1": True}}),
+    ("2024-01-01", {"initial": {}, "changes": {}}),
+    ("2024-01-01", {"initial": {}, "changes": [{"timestamp": "вчера", "changes": {}}]}),
+])
+def test_validate_rejects_bad_days(date_key, day):
+    with pytest.raises(ValueError):
+        ef.validate_history_day(date_key, day)
+
+
+def test_validate_normalizes_item_ids():
+    day = ef.validate_history_day("2024-01-01", {"initial": {1: 2}})
+    assert day == {"initial": {"1": 2}, "changes": [], "last_state": {"1": 2}}
+
+
+def test_merge_overlapping_days_deduplicates():
+    history = copy.deepcopy({"2024-01-01": HISTORY["2024-01-01"]})
+    imported = ef.validate_history_day("2024-01-01", {
+        "initial": {"1": 5, "4": 9},
+        "changes": HISTORY["2024-01-01"]["changes"] + [
+            {"timestamp": "2024-01-01T12:00:00+03:00", "changes": {"1": -3}}
+        ],
+        "last_state": {"1": 4, "2": 0}
+    })
+
+    assert ef.merge_history_day(history, "2024-01-01", imported) == 1
+    assert ef.merge_history_day(history, "2024-01-01", copy.deepcopy(imported)) == 0
+
+    day = history["2024-01-01"]
+    assert [r["timestamp"][11:16] for r in day["changes"]] == ["10:00", "11:00", "12:00"]
+    assert day["initial"] == {"1": 5, "2": 1, "4": 9}
+    assert day["last_state"] == {"1": 4, "2": 0}
+
+
+def test_merge_keeps_newer_last_state():
+    history = copy.deepcopy(HISTORY)
+    older = ef.validate_history_day("2024-01-02", {
+        "initial": {"1": 7},
+        "changes": [{"timestamp": "2024-01-02T08:00:00+03:00", "changes": {"1": 5}}],
+        "last_state": {"1": 12}
+    })
+
+    assert ef.merge_history_day(history, "2024-01-02", older) == 1
+    assert history["2024-01-02"]["last_state"] == {"1": 8, "3": 1}
+    assert history["2024-01-02"]["changes"][0]["timestamp"] == "2024-01-02T08:00:00+03:00"
+
+
+def test_merge_adds_new_day():
+    history = {}
+    day = ef.validate_history_day("2024-01-02", HISTORY["2024-01-02"])
+    assert ef.merge_history_day(history, "2024-01-02", day) == 1
+    assert history == {"2024-01-02": HISTORY["2024-01-02"]}
@@ -0,0 +1,87 @@
+import copy
+from datetime import date
+
+import egg_final as ef
+
+TODAY = date(2024, 3, 1)
+
+
+def raw_day(date_key, deltas, start=0):
+    """День с записью на каждое изменение предмета "1" """
+    count = start
+    changes = []
+    for hour, delta in enumerate(deltas):
+        count += delta
+        changes.append({"timestamp": f"{date_key}T{hour + 10:02d}:00:00+03:00", "changes": {"1": delta}})
+    return {"initial": {"1": start}, "changes": changes, "last_state": {"1": count}}
+
+
+def net(day):
+    return sum(record["changes"].get("1", 0) for record in day["changes"])
+
+
+def reimport(history, date_key, day):
+    return ef.merge_history_day(history, date_key, ef.validate_history_day(date_key, copy.deepcopy(day)))
+
+
+def test_compact_reimport_compact_keeps_net_delta():
+    original = raw_day("2024-01-10", [1, 1, 1])
+    history = {"2024-01-10": copy.deepcopy(original)}
+    engine = ef.RetentionEngine(compact_after_days=7)
+
+    assert engine.compact(history, TODAY)
+    assert reimport(history, "2024-01-10", original) == 0
+    engine.compact(history, TODAY)
+
+    assert net(history["2024-01-10"]) == 3
+    assert history["2024-01-10"]["last_state"] == {"1": 3}
+
+
+def test_reimport_into_weekly_rollup_is_deduplicated():
+    week = {f"2024-01-0{d}": raw_day(f"2024-01-0{d}", [1], start=d - 1) for d in range(1, 8)}
+    history = copy.deepcopy(week)
+    engine = ef.RetentionEngine(weekly_after_weeks=1)
+
+    engine.compact(history, TODAY)
+    assert list(history) == ["2024-01-01"]
+    assert net(history["2024-01-01"]) == 7
+
+    # Понедельник совпадает с ключом сводки, вторник появляется отдельным днём
+    reimport(history, "2024-01-01", week["2024-01-01"])
+    reimport(history, "2024-01-02", week["2024-01-02"])
+    engine.compact(history, TODAY)
+
+    rollup = history["2024-01-01"]
+    assert list(history) == ["2024-01-01"]
+    assert net(rollup) == 7
+    assert rollup["days"] == sorted(week)
+
+
+def test_compacted_export_into_raw_history_replaces_covered_records():
+    raw = raw_day("2024-01-10", [1, 1, 1])
+    compacted = copy.deepcopy(raw)
+    ef.compact_day(compacted)
+    history = {"2024-01-10": {"initial": {"1": 0}, "changes": raw["changes"][:1], "last_state": {"1": 1}}}
+
+    reimport(history, "2024-01-10", compacted)
+    assert net(history["2024-01-10"]) == 3
+
+    reimport(history, "2024-01-10", compacted)
+    reimport(history, "2024-01-10", raw)
+    assert net(history["2024-01-10"]) == 3
+
+
+def test_archive_merge_skips_already_rolled_up_days(tmp_path):
+    week = {f"2024-01-0{d}": raw_day(f"2024-01-0{d}", [1], start=d - 1) for d in range(1, 8)}
+    history = copy.deepcopy(week)
+    ef.RetentionEngine(weekly_after_weeks=1).compact(history, TODAY)
+
+    archive = ef.HistoryArchive(tmp_path)
+    archive.add_days(history)
+    archive.add_days({"2024-01-01": copy.deepcopy(week["2024-01-01"]),
+                      "2024-01-02": copy.deepcopy(week["2024-01-02"])})
+
+    reloaded = ef.HistoryArchive(tmp_path)
+    reloaded.load_index()
+    assert reloaded.dates() == ["2024-01-01"]
+    assert net(reloaded.get_day("2024-01-01")) == 7
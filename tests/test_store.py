@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import threading
+import subprocess
+
+import pytest
+
+import egg_final as ef
+
+HOLD_WRITER = """
+import sys
+import egg_final as ef
+store = ef.HistoryStore(sys.argv[1])
+print(store.acquire_writer(), flush=True)
+sys.stdin.read()
+"""
+
+
+def run_python(code, *args, **kwargs):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.Popen([sys.executable, "-c", code, *args], env=env, text=True, **kwargs)
+
+
+@pytest.fixture
+def holder():
+    """Запускает отдельный процесс, удерживающий право записи, до закрытия stdin"""
+    processes = []
+
+    def start(path):
+        process = run_python(HOLD_WRITER, path, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        processes.append(process)
+        return process, process.stdout.readline().strip() == "True"
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            process.stdin.close()
+            process.wait(10)
+
+
+def release(process):
+    process.stdin.close()
+    process.wait(10)
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback, *args):
+        self.scheduled.append(callback)
+
+
+class FakeViewer:
+    """Часть InventoryTracker, отвечающая за режим просмотра, без Tk"""
+    poll_store = ef.InventoryTracker.poll_store
+    promote_to_writer = ef.InventoryTracker.promote_to_writer
+    load_history = ef.InventoryTracker.load_history
+    save_history = ef.InventoryTracker.save_history
+
+    def __init__(self, tmp_path):
+        self.root = FakeRoot()
+        self.store = ef.HistoryStore(str(tmp_path / "history.json"))
+        self.price_store = ef.PriceStore(str(tmp_path / "prices.json"))
+        self.archive = ef.HistoryArchive(tmp_path / "archive")
+        self.retention = ef.RetentionEngine()
+        self.history = {}
+        self.history_lock = threading.RLock()
+        self.read_only = not self.store.acquire_writer()
+        self.refreshed = 0
+        self.statuses = []
+
+    def refresh_data(self):
+        self.refreshed += 1
+
+    def status(self, message):
+        self.statuses.append(message)
+
+    def history_changed(self, date_keys=None):
+        pass
+
+    def debug_print(self, message):
+        pass
+
+
+def test_viewer_is_promoted_when_writer_exits(tmp_path, holder):
+    path = str(tmp_path / "history.json")
+    process, acquired = holder(path)
+    assert acquired
+
+    viewer = FakeViewer(tmp_path)
+    assert viewer.read_only
+
+    viewer.poll_store()
+    assert viewer.read_only
+    assert viewer.root.scheduled == [viewer.poll_store]
+
+    release(process)
+    viewer.poll_store()
+    assert not viewer.read_only
+    assert viewer.refreshed == 1
+    assert len(viewer.root.scheduled) == 1  # опрос остановлен
+
+    with viewer.history_lock:
+        viewer.history["2024-01-01"] = {"initial": {}, "changes": [], "last_state": {"1": 1}}
+    viewer.save_history()
+
+    # Пока повышенное окно работает, новый процесс становится просмотром
+    process, acquired = holder(path)
+    assert not acquired
+
+    viewer.store.close()
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == viewer.history
+
+
+WRITE_HISTORY = """
+import sys, json, threading
+import egg_final as ef
+store = ef.HistoryStore(sys.argv[1])
+history = store.load()
+history.update(json.loads(sys.argv[2]))
+store.write(history, threading.RLock())
+"""
+
+SAVE_PRICES = """
+import sys
+import egg_final as ef
+store = ef.PriceStore(sys.argv[1])
+store.load()
+store.add_snapshot("2024-01-01", {"1": float(sys.argv[2])})
+store.save()
+"""
+
+
+def day(count):
+    return {"initial": {}, "changes": [], "last_state": {"1": count}}
+
+
+def run_to_end(code, *args):
+    process = run_python(code, *args)
+    assert process.wait(30) == 0
+
+
+def test_only_one_process_gets_writer_lock(tmp_path, holder):
+    path = str(tmp_path / "history.json")
+    results = [holder(path)[1] for _ in range(3)]
+    assert results == [True, False, False]
+    assert not ef.HistoryStore(path).acquire_writer()
+
+
+def test_reader_sees_new_version(tmp_path):
+    path = str(tmp_path / "history.json")
+    reader = ef.HistoryStore(path)
+    assert reader.load() == {}
+    assert not reader.changed()
+
+    run_to_end(WRITE_HISTORY, path, json.dumps({"2024-01-01": day(1)}))
+    assert reader.changed()
+    assert reader.load() == {"2024-01-01": day(1)}
+    assert not reader.changed()
+
+
+def test_write_merges_other_writers_version(tmp_path):
+    path = str(tmp_path / "history.json")
+    store = ef.HistoryStore(path)
+    history = store.load()
+    run_to_end(WRITE_HISTORY, path, json.dumps({"2024-01-01": day(1)}))
+
+    merged = []
+    history["2024-01-02"] = day(2)
+    store.write(history, threading.RLock(), on_merge=lambda: merged.append(True))
+    assert merged == [True]
+    assert sorted(ef.HistoryStore(path).load()) == ["2024-01-01", "2024-01-02"]
+
+
+def test_close_flushes_pending_save(tmp_path):
+    path = str(tmp_path / "history.json")
+    store = ef.HistoryStore(path)
+    assert store.acquire_writer()
+    history = store.load()
+    lock = threading.RLock()
+    store.start_writer(lambda: history, lock)
+
+    # Пока блокировка истории занята, поток записи не может закончить сохранение
+    with lock:
+        history["2024-01-01"] = day(1)
+        store.request_save()
+        history["2024-01-02"] = day(2)
+        store.request_save()
+    store.close()
+
+    assert ef.HistoryStore(path).load() == history
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_corrupt_file_from_other_writer_is_quarantined(tmp_path):
+    path = str(tmp_path / "history.json")
+    store = ef.HistoryStore(path)
+    history = store.load()
+    run_to_end(WRITE_HISTORY, path, json.dumps({"2024-01-01": day(1)}))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"2024-01-01": {')
+
+    history["2024-01-02"] = day(2)
+    store.write(history, threading.RLock())
+    history["2024-01-03"] = day(3)
+    store.write(history, threading.RLock())
+
+    assert sorted(ef.HistoryStore(path).load()) == ["2024-01-02", "2024-01-03"]
+    backups = [name for name in os.listdir(tmp_path) if ".corrupt-" in name]
+    assert len(backups) == 1
+
+
+def test_corrupt_file_at_startup_is_not_overwritten_silently(tmp_path):
+    path = str(tmp_path / "history.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("not json")
+
+    store = ef.HistoryStore(path)
+    with pytest.raises(ValueError):
+        store.load()
+    store.write({"2024-01-01": day(1)}, threading.RLock())
+
+    assert ef.HistoryStore(path).load() == {"2024-01-01": day(1)}
+    backups = [name for name in os.listdir(tmp_path) if ".corrupt-" in name]
+    with open(tmp_path / backups[0], encoding="utf-8") as f:
+        assert f.read() == "not json"
+
+
+def test_price_store_reloads_after_other_process_saves(tmp_path):
+    path = str(tmp_path / "prices.json")
+    viewer = ef.PriceStore(path)
+    viewer.load()
+    assert not viewer.changed()
+
+    run_to_end(SAVE_PRICES, path, "2.5")
+    assert viewer.changed()
+    version = viewer.version
+    viewer.load()
+    assert viewer.version > version
+    assert list(viewer.prices_on(["1"], "2024-06-01")) == [2.5]
+    assert not viewer.changed()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]